@@ -0,0 +1,77 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+"""
+Ahead-of-time compiled PNG unfilter kernel for fix_png_bound.py
+
+Same job as the Numba unfilter_image, without the JIT warmup on every run.
+Build it next to the script with:
+
+    python setup.py build_ext --inplace
+"""
+
+from libc.stdlib cimport calloc, free
+
+
+cdef inline int paeth_predict(int a, int b, int c) noexcept nogil:
+    """PNG Paeth predictor for left (a), up (b) and up-left (c), branch-free"""
+    cdef int pa = abs(b - c)
+    cdef int pb = abs(a - c)
+    cdef int pc = abs(a + b - 2 * c)
+
+    # All-ones / all-zeros masks pick the prediction without jumping
+    cdef int use_a = -((pa <= pb) & (pa <= pc))
+    cdef int use_b = ~use_a & -(pb <= pc)
+    return (use_a & a) | (use_b & b) | (~(use_a | use_b) & c)
+
+
+cpdef void unfilter_image(const unsigned char[::1] src, unsigned char[:, ::1] out,
+                          Py_ssize_t height, Py_ssize_t scanline_size, int bpp):
+    """Undo the filters of every scanline of src into out (height x row bytes)"""
+    cdef Py_ssize_t row_size = scanline_size - 1
+    cdef Py_ssize_t y, i
+    cdef const unsigned char* line
+    cdef const unsigned char* prev
+    cdef unsigned char* dst
+    cdef unsigned char filter_type
+    # Left neighbours only exist past the first pixel; never past the row end
+    cdef Py_ssize_t first_pixel = bpp if bpp < row_size else row_size
+
+    # A zero-width image (tampered IHDR) has nothing to unfilter, and
+    # &out[y, 0] would already point past its rows
+    if row_size <= 0:
+        return
+
+    cdef unsigned char* zero_row = <unsigned char*>calloc(row_size + 1, 1)
+    if zero_row == NULL:
+        raise MemoryError()
+
+    try:
+        with nogil:
+            for y in range(height):
+                filter_type = src[y * scanline_size]
+                line = &src[y * scanline_size + 1]
+                dst = &out[y, 0]
+                prev = &out[y - 1, 0] if y > 0 else zero_row
+
+                if filter_type == 1:  # Sub
+                    for i in range(first_pixel):
+                        dst[i] = line[i]
+                    for i in range(first_pixel, row_size):
+                        dst[i] = line[i] + dst[i - bpp]
+                elif filter_type == 2:  # Up
+                    for i in range(row_size):
+                        dst[i] = line[i] + prev[i]
+                elif filter_type == 3:  # Average
+                    for i in range(first_pixel):
+                        dst[i] = line[i] + (prev[i] >> 1)
+                    for i in range(first_pixel, row_size):
+                        dst[i] = line[i] + ((dst[i - bpp] + prev[i]) >> 1)
+                elif filter_type == 4:  # Paeth
+                    for i in range(first_pixel):
+                        dst[i] = line[i] + prev[i]
+                    for i in range(first_pixel, row_size):
+                        dst[i] = line[i] + paeth_predict(dst[i - bpp], prev[i], prev[i - bpp])
+                else:  # None
+                    for i in range(row_size):
+                        dst[i] = line[i]
+    finally:
+        free(zero_row)
@@ -7,63 +7,125 @@ This tool can detect:
 2. Hidden data in the decompressed image stream
 3. Actual image dimensions vs declared dimensions
 4. Extra data after filtering that suggests larger image
+
+Unfiltering uses the compiled _unfilter extension when it has been built
+(python setup.py build_ext --inplace), else Numba, else plain Python.
+Under PyPy the plain Python loops are used directly, since PyPy's JIT
+compiles them and beats per-row NumPy calls.
 """
 
 import sys
+import math
 import struct
 import zlib
-from PIL import Image
 import numpy as np
 
+try:
+    # Only needed for the default (PIL re-encoded) output; --fast writes the
+    # PNG by hand
+    from PIL import Image
+    HAVE_PIL = True
+except ImportError:
+    HAVE_PIL = False
+
+try:
+    import __pypy__
+    IS_PYPY = True
+except ImportError:
+    IS_PYPY = False
+
+try:
+    # Optional ahead-of-time compiled kernel, see setup.py
+    import _unfilter
+    HAVE_UNFILTER_EXT = True
+except ImportError:
+    HAVE_UNFILTER_EXT = False
+
+try:
+    # Optional libdeflate binding, about twice as fast as zlib at inflating
+    import deflate
+    HAVE_LIBDEFLATE = True
+except ImportError:
+    HAVE_LIBDEFLATE = False
+
+HAVE_NUMBA = False
+if not HAVE_UNFILTER_EXT and not IS_PYPY:
+    # Only worth importing (and warming up) numba when there is no compiled kernel
+    try:
+        from numba import njit
+        HAVE_NUMBA = True
+    except ImportError:
+        pass
+
+if not HAVE_NUMBA:
+    def njit(*args, **kwargs):
+        """Stand-in for numba.njit: leave the function as plain Python"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+
+class PNGChunk:
+    """One PNG chunk; its CRC is only computed if crc_valid is asked for"""
+    
+    # Fixed fields, no per-instance __dict__: files can have thousands of IDATs
+    __slots__ = ('type', 'length', 'data', 'crc', '_crc_valid')
+    
+    def __init__(self, chunk_type, length, data, crc):
+        self.type = chunk_type
+        self.length = length
+        self.data = data
+        self.crc = crc
+        self._crc_valid = None
+    
+    @property
+    def crc_valid(self):
+        if self._crc_valid is None:
+            # Incremental CRC over type then data, no concatenated copy
+            expected_crc = zlib.crc32(self.data, zlib.crc32(self.type)) & 0xffffffff
+            self._crc_valid = self.crc == expected_crc
+        return self._crc_valid
+
 
 def read_png_chunks(filepath):
     """Read all PNG chunks with their data"""
     chunks = []
     try:
+        # One read for the whole file; chunks are then sliced out without copying
         with open(filepath, 'rb') as f:
-            # Check PNG signature
-            signature = f.read(8)
-            expected = b'\x89PNG\r\n\x1a\n'
+            data = f.read()
+        view = memoryview(data)
+        
+        # Check PNG signature
+        signature = data[:8]
+        expected = b'\x89PNG\r\n\x1a\n'
+        
+        if signature != expected:
+            print(f"Warning: Invalid PNG signature!")
+            return None
+        
+        offset = 8
+        while True:
+            # Chunk length and type
+            if offset + 8 > len(data):
+                break
             
-            if signature != expected:
-                print(f"Warning: Invalid PNG signature!")
-                return None
+            length = struct.unpack_from('>I', data, offset)[0]
+            chunk_type = data[offset + 4:offset + 8]
+            
+            # Chunk data
+            chunk_data = view[offset + 8:offset + 8 + length]
+            
+            # CRC
+            crc_value = struct.unpack_from('>I', data, offset + 8 + length)[0]
+            offset += 12 + length
+            
+            chunks.append(PNGChunk(chunk_type, length, chunk_data, crc_value))
+            
+            # IEND marks end of PNG
+            if chunk_type == b'IEND':
+                break
             
-            while True:
-                # Read chunk length
-                length_data = f.read(4)
-                if len(length_data) < 4:
-                    break
-                    
-                length = struct.unpack('>I', length_data)[0]
-                
-                # Read chunk type
-                chunk_type = f.read(4)
-                if len(chunk_type) < 4:
-                    break
-                
-                # Read chunk data
-                chunk_data = f.read(length)
-                
-                # Read CRC
-                crc = f.read(4)
-                crc_value = struct.unpack('>I', crc)[0]
-                
-                # Calculate expected CRC
-                expected_crc = zlib.crc32(chunk_type + chunk_data) & 0xffffffff
-                
-                chunks.append({
-                    'type': chunk_type,
-                    'length': length,
-                    'data': chunk_data,
-                    'crc': crc_value,
-                    'crc_valid': crc_value == expected_crc
-                })
-                
-                # IEND marks end of PNG
-                if chunk_type == b'IEND':
-                    break
-                    
     except Exception as e:
         print(f"Error reading chunks: {e}")
         return None
@@ -124,44 +186,284 @@ def analyze_ihdr(ihdr_data):
     }
 
 
-def unfilter_scanline(scanline, prev_scanline, filter_type, bytes_per_pixel):
-    """Apply PNG unfiltering to a scanline"""
-    result = bytearray(scanline)
+@njit(inline='always')
+def paeth_predict(a, b, c):
+    """PNG Paeth predictor for left (a), up (b) and up-left (c), branch-free"""
+    pa = abs(b - c)
+    pb = abs(a - c)
+    pc = abs(a + b - 2 * c)
+    
+    # All-ones / all-zeros masks pick the prediction without jumping, which
+    # compiles to conditional moves instead of mispredicted branches
+    use_a = -((pa <= pb) & (pa <= pc))
+    use_b = ~use_a & -(pb <= pc)
+    return (use_a & a) | (use_b & b) | (~(use_a | use_b) & c)
+
+
+# The plain Python loops below call the predictor once per byte and must not
+# go through the Numba dispatcher to do it
+paeth_predict_python = paeth_predict.py_func if HAVE_NUMBA else paeth_predict
+
+
+@njit(cache=True)
+def paeth_unfilter(scanline, prev, bytes_per_pixel, out):
+    """Undo the Paeth filter of one scanline into out"""
+    for i in range(len(scanline)):
+        left = int(out[i - bytes_per_pixel]) if i >= bytes_per_pixel else 0
+        up = int(prev[i])
+        up_left = int(prev[i - bytes_per_pixel]) if i >= bytes_per_pixel else 0
+        
+        out[i] = (int(scanline[i]) + paeth_predict(left, up, up_left)) & 0xFF
+
+
+@njit(inline='always')
+def swar_add_bytes(x, y, low7, high1):
+    """Add the bytes packed in two integers lane by lane, without carries"""
+    return ((x & low7) + (y & low7)) ^ ((x ^ y) & high1)
+
+
+@njit(cache=True)
+def sub_unfilter(src, bytes_per_pixel, dst):
+    """Undo the Sub filter of one scanline into dst"""
+    dst[:] = src
+    
+    # One pixel fills a whole machine word for these depths, so each step
+    # adds all of its bytes at once (SIMD within a register)
+    if bytes_per_pixel == 8:
+        lanes = dst.view(np.uint64)
+        low7 = np.uint64(0x7F7F7F7F7F7F7F7F)
+        high1 = np.uint64(0x8080808080808080)
+        for i in range(1, len(lanes)):
+            lanes[i] = swar_add_bytes(lanes[i], lanes[i - 1], low7, high1)
+    elif bytes_per_pixel == 4:
+        lanes = dst.view(np.uint32)
+        low7 = np.uint32(0x7F7F7F7F)
+        high1 = np.uint32(0x80808080)
+        for i in range(1, len(lanes)):
+            lanes[i] = swar_add_bytes(lanes[i], lanes[i - 1], low7, high1)
+    elif bytes_per_pixel == 2:
+        lanes = dst.view(np.uint16)
+        low7 = np.uint16(0x7F7F)
+        high1 = np.uint16(0x8080)
+        for i in range(1, len(lanes)):
+            lanes[i] = swar_add_bytes(lanes[i], lanes[i - 1], low7, high1)
+    else:
+        for i in range(bytes_per_pixel, len(dst)):
+            dst[i] = (dst[i] + dst[i - bytes_per_pixel]) & 0xFF
+
+
+@njit(inline='always')
+def unfilter_rows(decompressed, out, height, scanline_size, bytes_per_pixel):
+    """Undo the filters of every scanline in one pass, one row per output row"""
+    row_size = scanline_size - 1
+    zero_row = np.zeros(row_size, dtype=np.uint8)
+    
+    for y in range(height):
+        offset = y * scanline_size
+        filter_type = decompressed[offset]
+        src = decompressed[offset + 1:offset + scanline_size]
+        # The previous output row is still hot in cache; use it in place
+        # rather than keeping a separate prev/curr buffer pair
+        dst = out[y]
+        prev = out[y - 1] if y > 0 else zero_row
+        
+        if filter_type == 1:  # Sub
+            sub_unfilter(src, bytes_per_pixel, dst)
+        elif filter_type == 2:  # Up
+            for i in range(row_size):
+                dst[i] = (src[i] + prev[i]) & 0xFF
+        elif filter_type == 3:  # Average
+            for i in range(row_size):
+                left = int(dst[i - bytes_per_pixel]) if i >= bytes_per_pixel else 0
+                dst[i] = (src[i] + ((left + int(prev[i])) // 2)) & 0xFF
+        elif filter_type == 4:  # Paeth
+            # Sweeping runs of Paeth rows along anti-diagonals removes the
+            # left dependency, but without real SIMD lanes the strided
+            # accesses make it slower than this row loop, so rows stay serial
+            paeth_unfilter(src, prev, bytes_per_pixel, dst)
+        else:  # None
+            dst[:] = src
+
+
+@njit(cache=True)
+def unfilter_image(decompressed, height, scanline_size, bytes_per_pixel):
+    """Unfilter the whole image into a (height, row bytes) array
+    
+    unfilter_rows is inlined once per pixel size PNG can have, so each copy
+    sees bytes_per_pixel as a constant and gets its indexing and loops
+    specialized, like libpng's separate 3- and 4-byte Paeth routines.
+    """
+    out = np.empty((height, scanline_size - 1), dtype=np.uint8)
+    
+    if bytes_per_pixel == 1:
+        unfilter_rows(decompressed, out, height, scanline_size, 1)
+    elif bytes_per_pixel == 2:
+        unfilter_rows(decompressed, out, height, scanline_size, 2)
+    elif bytes_per_pixel == 3:
+        unfilter_rows(decompressed, out, height, scanline_size, 3)
+    elif bytes_per_pixel == 4:
+        unfilter_rows(decompressed, out, height, scanline_size, 4)
+    elif bytes_per_pixel == 6:
+        unfilter_rows(decompressed, out, height, scanline_size, 6)
+    elif bytes_per_pixel == 8:
+        unfilter_rows(decompressed, out, height, scanline_size, 8)
+    else:
+        unfilter_rows(decompressed, out, height, scanline_size, bytes_per_pixel)
+    
+    return out
+
+
+if HAVE_NUMBA:
+    # Compile now so the first real image doesn't pay for it
+    _dummy = np.zeros(2, dtype=np.uint8)
+    unfilter_image(_dummy, 1, 2, 1)
+    del _dummy
+
+
+def unfilter_image_python(decompressed, height, scanline_size, bytes_per_pixel):
+    """Unfilter the whole image into a flat bytearray with plain Python loops
+    
+    Slow on CPython, but exactly what PyPy's tracing JIT is good at.
+    """
+    row_size = scanline_size - 1
+    bpp = bytes_per_pixel
+    out = bytearray(height * row_size)
+    
+    for y in range(height):
+        src = y * scanline_size + 1
+        filter_type = decompressed[src - 1]
+        row = y * row_size
+        prev = row - row_size
+        has_prev = y > 0
+        
+        if filter_type == 1:  # Sub
+            for i in range(row_size):
+                left = out[row + i - bpp] if i >= bpp else 0
+                out[row + i] = (decompressed[src + i] + left) & 0xFF
+        elif filter_type == 2:  # Up
+            for i in range(row_size):
+                up = out[prev + i] if has_prev else 0
+                out[row + i] = (decompressed[src + i] + up) & 0xFF
+        elif filter_type == 3:  # Average
+            for i in range(row_size):
+                left = out[row + i - bpp] if i >= bpp else 0
+                up = out[prev + i] if has_prev else 0
+                out[row + i] = (decompressed[src + i] + ((left + up) // 2)) & 0xFF
+        elif filter_type == 4:  # Paeth
+            for i in range(row_size):
+                left = out[row + i - bpp] if i >= bpp else 0
+                up = out[prev + i] if has_prev else 0
+                up_left = out[prev + i - bpp] if has_prev and i >= bpp else 0
+                out[row + i] = (decompressed[src + i] + paeth_predict_python(left, up, up_left)) & 0xFF
+        else:  # None
+            out[row:row + row_size] = decompressed[src:src + row_size]
+    
+    return out
+
+
+def unfilter_scanline(scanline, prev_scanline, out, filter_type, bytes_per_pixel):
+    """Apply PNG unfiltering to a scanline, writing the result into out
+    
+    All three can be any byte buffers (memoryview, bytearray, uint8 array
+    slice) of the same length; out must be writable. Nothing is returned
+    and nothing is copied on the way in.
+    """
+    scanline = np.frombuffer(scanline, dtype=np.uint8)
+    prev_scanline = np.frombuffer(prev_scanline, dtype=np.uint8)
+    out = np.frombuffer(out, dtype=np.uint8)
     
     if filter_type == 0:  # None
-        return result
+        out[:] = scanline
     elif filter_type == 1:  # Sub
-        for i in range(bytes_per_pixel, len(result)):
-            result[i] = (result[i] + result[i - bytes_per_pixel]) & 0xFF
+        # Each of the bytes_per_pixel interleaved lanes is a running sum;
+        # uint8 accumulation wraps mod 256 exactly like the PNG spec
+        lanes = scanline.reshape(-1, bytes_per_pixel)
+        np.cumsum(lanes, axis=0, dtype=np.uint8, out=out.reshape(-1, bytes_per_pixel))
     elif filter_type == 2:  # Up
-        for i in range(len(result)):
-            result[i] = (result[i] + prev_scanline[i]) & 0xFF
-    elif filter_type == 3:  # Average
-        for i in range(len(result)):
-            left = result[i - bytes_per_pixel] if i >= bytes_per_pixel else 0
-            up = prev_scanline[i]
-            result[i] = (result[i] + ((left + up) // 2)) & 0xFF
-    elif filter_type == 4:  # Paeth
-        for i in range(len(result)):
-            left = result[i - bytes_per_pixel] if i >= bytes_per_pixel else 0
-            up = prev_scanline[i]
-            up_left = prev_scanline[i - bytes_per_pixel] if i >= bytes_per_pixel else 0
-            
-            p = left + up - up_left
-            pa = abs(p - left)
-            pb = abs(p - up)
-            pc = abs(p - up_left)
-            
-            if pa <= pb and pa <= pc:
-                pr = left
-            elif pb <= pc:
-                pr = up
-            else:
-                pr = up_left
-            
-            result[i] = (result[i] + pr) & 0xFF
-    
-    return bytes(result)
+        np.add(scanline, prev_scanline, out=out, casting='unsafe')
+    else:
+        # Average and Paeth depend on the already-unfiltered left byte, so
+        # they stay scalar; plain Python ints are much cheaper to index than
+        # numpy
+        result = scanline.tolist()
+        prev = prev_scanline.tolist()
+        
+        if filter_type == 3:  # Average
+            for i in range(len(result)):
+                left = result[i - bytes_per_pixel] if i >= bytes_per_pixel else 0
+                up = prev[i]
+                result[i] = (result[i] + ((left + up) // 2)) & 0xFF
+        elif filter_type == 4:  # Paeth
+            for i in range(len(result)):
+                left = result[i - bytes_per_pixel] if i >= bytes_per_pixel else 0
+                up = prev[i]
+                up_left = prev[i - bytes_per_pixel] if i >= bytes_per_pixel else 0
+                result[i] = (result[i] + paeth_predict_python(left, up, up_left)) & 0xFF
+        
+        out[:] = result
+
+
+# Best case expansion of DEFLATE: a 258 byte match coded in 2 bits
+MAX_DEFLATE_RATIO = 1032
+
+# deflate.zlib_decompress wraps its size argument to 32 bits
+LIBDEFLATE_MAX_OUTPUT = 2 ** 32 - 1
+
+
+def decompress_idat(idat_chunks, size_hint):
+    """Inflate the concatenated IDAT stream"""
+    if HAVE_LIBDEFLATE:
+        # libdeflate can't stream and needs an output bound up front. Start
+        # from a few times the declared size and grow it while it's too
+        # small, up to DEFLATE's worst case; each retry is a full decode
+        compressed = b''.join(c.data for c in idat_chunks)
+        max_bound = min(len(compressed) * MAX_DEFLATE_RATIO, LIBDEFLATE_MAX_OUTPUT)
+        output_bound = min(4 * size_hint + 1, max_bound)
+        while True:
+            try:
+                return deflate.zlib_decompress(compressed, output_bound)
+            except deflate.DeflateError:
+                # Either the bound is too small or the stream is corrupt
+                if output_bound >= max_bound:
+                    break
+                output_bound = min(output_bound * 4, max_bound)
+            except Exception:
+                # e.g. MemoryError reserving the output buffer
+                break
+        # Corrupt, over 4 GiB or out of memory: zlib decodes it again, only
+        # growing as far as the real size (and gives the error message)
+    
+    # Feed zlib chunk by chunk instead of joining the compressed stream first
+    decompressor = zlib.decompressobj()
+    decompressed = bytearray()
+    for chunk in idat_chunks:
+        decompressed += decompressor.decompress(chunk.data)
+    decompressed += decompressor.flush()
+    if not decompressor.eof:
+        raise zlib.error("incomplete or truncated stream")
+    
+    return decompressed
+
+
+def find_dimension_candidates(data_size, bytes_per_pixel):
+    """List every (width, height, scanline_size) that tiles data_size exactly
+    
+    A scanline is 1 filter byte + width * bytes_per_pixel, so the candidates
+    are the divisors of data_size that are 1 more than a multiple of
+    bytes_per_pixel.
+    """
+    # Trial division up to sqrt(data_size) as one vectorized modulo
+    small = np.arange(1, math.isqrt(data_size) + 1, dtype=np.int64)
+    small = small[data_size % small == 0]
+    divisors = np.union1d(small, data_size // small)
+    
+    scanline_sizes = divisors[(divisors > 1) & ((divisors - 1) % bytes_per_pixel == 0)]
+    candidates = []
+    for scanline_size in scanline_sizes.tolist():
+        width = (scanline_size - 1) // bytes_per_pixel
+        candidates.append((width, data_size // scanline_size, scanline_size))
+    
+    return candidates
 
 
 def analyze_image_data(chunks, ihdr_info):
@@ -169,28 +471,36 @@ def analyze_image_data(chunks, ihdr_info):
     
     print("\nAnalyzing decompressed image data...")
     
+    # Calculate expected size based on declared dimensions
+    declared_width = ihdr_info['width']
+    declared_height = ihdr_info['height']
+    bytes_per_pixel = ihdr_info['bytes_per_pixel']
+    
+    # Each scanline has: 1 byte filter type + (width * bytes_per_pixel) data
+    expected_scanline_size = 1 + (declared_width * bytes_per_pixel)
+    expected_total_size = declared_height * expected_scanline_size
+    
     # Get all IDAT chunks
-    idat_chunks = [c for c in chunks if c['type'] == b'IDAT']
-    combined_idat = b''.join(c['data'] for c in idat_chunks)
+    idat_chunks = [c for c in chunks if c.type == b'IDAT']
+    
+    # DEFLATE cannot expand data by more than MAX_DEFLATE_RATIO, so if even
+    # that can't get past the declared size there is nothing hidden and the
+    # stream doesn't need decoding. (Compressed vs declared size says nothing
+    # more than that: hidden rows compress just as well as visible ones.)
+    total_compressed = sum(c.length for c in idat_chunks)
+    if total_compressed * MAX_DEFLATE_RATIO <= expected_total_size:
+        print(f"Compressed IDAT size ({total_compressed} bytes) cannot hold more than the declared image")
+        return None
     
     # Decompress
     try:
-        decompressed = zlib.decompress(combined_idat)
+        decompressed = decompress_idat(idat_chunks, expected_total_size)
     except Exception as e:
         print(f"Error decompressing: {e}")
         return None
     
     print(f"Decompressed data size: {len(decompressed)} bytes")
     
-    # Calculate expected size based on declared dimensions
-    declared_width = ihdr_info['width']
-    declared_height = ihdr_info['height']
-    bytes_per_pixel = ihdr_info['bytes_per_pixel']
-    
-    # Each scanline has: 1 byte filter type + (width * bytes_per_pixel) data
-    expected_scanline_size = 1 + (declared_width * bytes_per_pixel)
-    expected_total_size = declared_height * expected_scanline_size
-    
     print(f"\nDeclared dimensions: {declared_width} x {declared_height}")
     print(f"Bytes per pixel: {bytes_per_pixel}")
     print(f"Expected scanline size: {expected_scanline_size} bytes")
@@ -223,28 +533,58 @@ def analyze_image_data(chunks, ihdr_info):
         else:
             # Maybe the width is different?
             print(f"\n  Trying to find actual width...")
-            for width_guess in range(declared_width - 100, declared_width + 500):
-                if width_guess <= 0:
-                    continue
-                scanline_guess = 1 + (width_guess * bytes_per_pixel)
-                if len(decompressed) % scanline_guess == 0:
-                    height_guess = len(decompressed) // scanline_guess
-                    print(f"  Possible dimensions: {width_guess} x {height_guess}")
-                    
-                    # Use the first match that's reasonable
-                    if height_guess > declared_height:
-                        return {
-                            'actual_width': width_guess,
-                            'actual_height': height_guess,
-                            'decompressed_data': decompressed,
-                            'scanline_size': scanline_guess,
-                            'bytes_per_pixel': bytes_per_pixel
-                        }
+            candidates = [
+                c for c in find_dimension_candidates(len(decompressed), bytes_per_pixel)
+                if c[1] > declared_height
+            ]
+            # Closest to the declared width first
+            candidates.sort(key=lambda c: abs(c[0] - declared_width))
+            
+            for width_guess, height_guess, _ in candidates:
+                print(f"  Possible dimensions: {width_guess} x {height_guess}")
+            
+            if candidates:
+                width_guess, height_guess, scanline_guess = candidates[0]
+                return {
+                    'actual_width': width_guess,
+                    'actual_height': height_guess,
+                    'decompressed_data': decompressed,
+                    'scanline_size': scanline_guess,
+                    'bytes_per_pixel': bytes_per_pixel
+                }
     
     return None
 
 
-def reconstruct_full_image(analysis, ihdr_info, output_path):
+def png_chunk(chunk_type, data):
+    """Serialize one PNG chunk: length, type, data, CRC"""
+    crc = zlib.crc32(data, zlib.crc32(chunk_type)) & 0xffffffff
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', crc)
+
+
+def write_png_fast(path, img_array, color_type):
+    """Write an 8-bit PNG directly: filter None on every row, fast deflate"""
+    height, width = img_array.shape[:2]
+    rows = img_array.reshape((height, -1))
+    
+    # Prepend the filter byte (0 = None) to every row
+    filtered = np.zeros((height, rows.shape[1] + 1), dtype=np.uint8)
+    filtered[:, 1:] = rows
+    
+    if HAVE_LIBDEFLATE:
+        idat = deflate.zlib_compress(filtered.tobytes(), 1)
+    else:
+        idat = zlib.compress(filtered.tobytes(), 1)
+    
+    ihdr = struct.pack('>II5B', width, height, 8, color_type, 0, 0, 0)
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(png_chunk(b'IHDR', ihdr))
+        f.write(png_chunk(b'IDAT', idat))
+        f.write(png_chunk(b'IEND', b''))
+
+
+def reconstruct_full_image(analysis, ihdr_info, output_path, fast=False):
     """Reconstruct the full image from raw data"""
     
     print(f"\nReconstructing full image...")
@@ -256,58 +596,88 @@ def reconstruct_full_image(analysis, ihdr_info, output_path):
     bytes_per_pixel = analysis['bytes_per_pixel']
     channels = ihdr_info['channels']
     
-    # Unfilter the image data
-    decompressed = analysis['decompressed_data']
-    raw_data = bytearray()
-    
-    prev_scanline = bytearray(width * bytes_per_pixel)
-    
-    for y in range(height):
-        offset = y * scanline_size
-        filter_type = decompressed[offset]
-        scanline = decompressed[offset + 1:offset + scanline_size]
-        
-        unfiltered = unfilter_scanline(scanline, prev_scanline, filter_type, bytes_per_pixel)
-        raw_data.extend(unfiltered)
-        prev_scanline = bytearray(unfiltered)
-    
-    # Convert to numpy array based on color type
+    # Check the color type first: unknown ones have no bytes_per_pixel to
+    # unfilter with
     if ihdr_info['color_type'] == 6:  # RGBA
-        img_array = np.frombuffer(raw_data, dtype=np.uint8).reshape((height, width, 4))
+        shape = (height, width, 4)
         mode = 'RGBA'
     elif ihdr_info['color_type'] == 2:  # RGB
-        img_array = np.frombuffer(raw_data, dtype=np.uint8).reshape((height, width, 3))
+        shape = (height, width, 3)
         mode = 'RGB'
     elif ihdr_info['color_type'] == 0:  # Grayscale
-        img_array = np.frombuffer(raw_data, dtype=np.uint8).reshape((height, width))
+        shape = (height, width)
         mode = 'L'
     else:
         print(f"Unsupported color type: {ihdr_info['color_type']}")
         return False
+    if bytes_per_pixel < 1:
+        print(f"Unsupported bit depth: {ihdr_info['bit_depth']}")
+        return False
+    
+    # Unfilter the image data
+    decompressed = np.frombuffer(analysis['decompressed_data'], dtype=np.uint8)
+    
+    if HAVE_UNFILTER_EXT:
+        pixels = np.empty((height, scanline_size - 1), dtype=np.uint8)
+        _unfilter.unfilter_image(decompressed, pixels, height, scanline_size, bytes_per_pixel)
+    elif HAVE_NUMBA:
+        pixels = unfilter_image(decompressed, height, scanline_size, bytes_per_pixel)
+    elif IS_PYPY:
+        raw_data = unfilter_image_python(analysis['decompressed_data'], height, scanline_size, bytes_per_pixel)
+        pixels = np.frombuffer(raw_data, dtype=np.uint8)
+    else:
+        # Rows are unfiltered in place and the previous row is just a view,
+        # so no row buffer is allocated or copied per scanline
+        pixels = np.empty((height, scanline_size - 1), dtype=np.uint8)
+        zero_row = np.zeros(scanline_size - 1, dtype=np.uint8)
+        
+        for y in range(height):
+            offset = y * scanline_size
+            filter_type = decompressed[offset]
+            scanline = decompressed[offset + 1:offset + scanline_size]
+            prev_scanline = pixels[y - 1] if y > 0 else zero_row
+            
+            unfilter_scanline(scanline, prev_scanline, pixels[y], filter_type, bytes_per_pixel)
     
-    # Create PIL image
-    img = Image.fromarray(img_array, mode=mode)
+    # Convert to numpy array based on color type
+    img_array = pixels.reshape(shape)
     
-    # Save
-    img.save(output_path, 'PNG')
+    if fast or not HAVE_PIL:
+        # Skip PIL's re-encode (per-row filter selection, slower deflate)
+        write_png_fast(output_path, img_array, ihdr_info['color_type'])
+    else:
+        # Create PIL image
+        img = Image.fromarray(img_array, mode=mode)
+        
+        # Save
+        img.save(output_path, 'PNG')
     print(f"✓ Full image saved to: {output_path}")
     
     return True
 
 
 def main():
-    if len(sys.argv) < 2:
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    verify_crc = '--verify-crc' in sys.argv[1:]
+    fast = '--fast' in sys.argv[1:]
+    
+    if len(args) < 1:
         print("Advanced PNG Content Analyzer")
         print("=" * 60)
-        print("Usage: python png_advanced_fix.py <input.png> [output.png]")
+        print("Usage: python png_advanced_fix.py <input.png> [output.png] [--verify-crc] [--fast]")
         print("\nThis tool analyzes PNG files to detect:")
         print("  • Hidden content beyond declared dimensions")
         print("  • Actual image size vs declared size")
         print("  • Corrupted chunks and structure issues")
+        print("\nOptions:")
+        print("  --verify-crc   Check the CRC of every chunk")
+        print("  --fast         Write the output PNG directly (no filtering, fast deflate)")
+        print("\nFor large images without Numba or the compiled kernel, run it under")
+        print("PyPy (pypy3 fix_png_bound.py ...): its JIT speeds up the unfilter loops.")
         sys.exit(1)
     
-    input_path = sys.argv[1]
-    output_path = sys.argv[2] if len(sys.argv) > 2 else input_path.rsplit('.', 1)[0] + '_full.png'
+    input_path = args[0]
+    output_path = args[1] if len(args) > 1 else input_path.rsplit('.', 1)[0] + '_full.png'
     
     print(f"Analyzing: {input_path}")
     print("=" * 60)
@@ -320,17 +690,20 @@ def main():
     
     print(f"\nFound {len(chunks)} chunks:")
     for chunk in chunks:
-        chunk_type = chunk['type'].decode('ascii', errors='replace')
-        crc_status = "✓" if chunk['crc_valid'] else "✗ INVALID"
-        print(f"  {chunk_type:8s} - {chunk['length']:6d} bytes - CRC: {crc_status}")
+        chunk_type = chunk.type.decode('ascii', errors='replace')
+        if not verify_crc:
+            crc_status = "not checked"
+        else:
+            crc_status = "✓" if chunk.crc_valid else "✗ INVALID"
+        print(f"  {chunk_type:8s} - {chunk.length:6d} bytes - CRC: {crc_status}")
     
     # Get IHDR
-    ihdr_chunk = next((c for c in chunks if c['type'] == b'IHDR'), None)
+    ihdr_chunk = next((c for c in chunks if c.type == b'IHDR'), None)
     if not ihdr_chunk:
         print("✗ No IHDR chunk found")
         sys.exit(1)
     
-    ihdr_info = analyze_ihdr(ihdr_chunk['data'])
+    ihdr_info = analyze_ihdr(ihdr_chunk.data)
     print(f"\nDeclared Image Information:")
     print(f"  Dimensions: {ihdr_info['width']} x {ihdr_info['height']}")
     print(f"  Color Type: {ihdr_info['color_type_name']}")
@@ -348,7 +721,7 @@ def main():
         print(f"Actual size:   {analysis['actual_width']} x {analysis['actual_height']}")
         
         # Reconstruct the full image
-        success = reconstruct_full_image(analysis, ihdr_info, output_path)
+        success = reconstruct_full_image(analysis, ihdr_info, output_path, fast)
         
         if success:
             print(f"\n{'='*60}")
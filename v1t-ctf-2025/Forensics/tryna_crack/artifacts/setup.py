@@ -0,0 +1,20 @@
+"""
+Build the optional compiled unfilter kernel used by fix_png_bound.py
+
+    python setup.py build_ext --inplace
+"""
+
+from setuptools import setup, Extension
+from Cython.Build import cythonize
+
+
+setup(
+    name='_unfilter',
+    ext_modules=cythonize([
+        Extension(
+            '_unfilter',
+            ['_unfilter.pyx'],
+            extra_compile_args=['-O3', '-march=native'],
+        )
+    ]),
+)